@@ -143,11 +143,15 @@ if deep_btn:
                 with open(report2_path, encoding="utf-8") as f:
                     st.markdown(f.read())
     with tab2:
-        st.subheader("📋 明细数据")
-        for csv in ["b站列表数据.csv", "b站详情数据.csv", "b站弹幕数据.csv"]:
+        st.subheader("📋 汇总数据")
+        # 读取预先聚合好的小表，不再加载原始弹幕/评论明细
+        for csv in ["b站列表数据.csv", "b站互动指标.csv", "b站弹幕高光时刻.csv"]:
             if os.path.exists(csv):
                 st.markdown(f"**{csv}**")
                 st.dataframe(pd.read_csv(csv))
+        if os.path.exists("b站弹幕发送时段.csv"):
+            st.markdown("**弹幕发送时段分布（北京时间）**")
+            st.bar_chart(pd.read_csv("b站弹幕发送时段.csv").set_index("hour")["count"])
     with tab3:
         st.subheader("⬇️ 下载报告（Markdown）")
         for md_file in ["report1.md", "report2.md"]:
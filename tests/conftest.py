@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 让测试可以直接 import tools.*
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from tools import async_runtime
+
+
+async def current_session():
+    async with async_runtime.session_scope() as session:
+        # 嵌套调用复用外层 session
+        async with async_runtime.session_scope() as inner:
+            assert inner is session
+        return session
+
+
+def test_background_session_reused_across_run_sync():
+    first = async_runtime.run_sync(current_session())
+    second = async_runtime.run_sync(current_session())
+    assert first is second
+    assert not first.closed
+
+
+def test_run_sync_inside_background_loop_raises():
+    async def nested():
+        return async_runtime.run_sync(current_session())
+
+    with pytest.raises(RuntimeError, match="run_sync"):
+        async_runtime.run_sync(nested())
+
+
+def test_caller_loop_session_closed_after_scope():
+    session = asyncio.run(current_session())
+    assert session.closed
+
+
+def test_arun_on_caller_loop(monkeypatch):
+    pytest.importorskip("crewai")
+    pytest.importorskip("bilibili_api")
+    from tools.search_tool import BilibiliSearchTool
+
+    tool = BilibiliSearchTool()
+    seen = {}
+
+    async def fake_main_async(self, keyword, max_videos, comment_pages, max_danmaku):
+        seen["loop"] = asyncio.get_running_loop()
+        seen["session"] = await current_session()
+        assert not seen["session"].closed
+        return f"{keyword}:{max_videos}:{comment_pages}:{max_danmaku}"
+
+    # BaseTool 是 pydantic 模型，不能在实例上打补丁
+    monkeypatch.setattr(BilibiliSearchTool, "main_async", fake_main_async)
+
+    async def main():
+        result = await tool._arun("AI工作流", 3, 1, 20)
+        return result, asyncio.get_running_loop()
+
+    result, loop = asyncio.run(main())
+    assert result == "AI工作流:3:1:20"
+    # 在调用方自己的循环上执行，返回前关闭本次调用的 session
+    assert seen["loop"] is loop
+    assert seen["session"].closed
@@ -0,0 +1,142 @@
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tools.danmaku_stats import DanmakuAggregator
+
+
+def danmaku(bvid, offsets, send_ts=0, title="标题"):
+    return pd.DataFrame({
+        "bvid": bvid,
+        "video_title": title,
+        "danmaku_offset": np.asarray(offsets, dtype=float),
+        "danmaku_send_ts": send_ts,
+    })
+
+
+@pytest.fixture
+def aggregator():
+    return DanmakuAggregator(bin_seconds=10, peak_z=2.0, peak_min_count=3, top_k=3)
+
+
+def test_density(aggregator):
+    df = aggregator.normalize_danmaku(pd.concat([
+        danmaku("BV1", [0, 5, 9.9, 10, 35]),
+        danmaku("BV2", [61]),
+    ]))
+    density = aggregator.density(df)
+    assert density.to_dict("records") == [
+        {"bvid": "BV1", "bin_start": 0, "count": 3},
+        {"bvid": "BV1", "bin_start": 10, "count": 1},
+        {"bvid": "BV1", "bin_start": 30, "count": 1},
+        {"bvid": "BV2", "bin_start": 60, "count": 1},
+    ]
+
+
+def test_peaks_uses_video_duration(aggregator):
+    # 弹幕集中在视频前 50 秒：只看有弹幕的分桶时均值被抬高，找不到高光
+    offsets = [1] * 4 + [11] * 3 + [21] * 4 + [31] * 3 + [41] * 8
+    df = aggregator.normalize_danmaku(danmaku("BV1", offsets))
+    density = aggregator.density(df)
+    titles = pd.Series({"BV1": "标题"})
+
+    assert aggregator.peaks(density, titles).empty
+
+    # 按 10 分钟的视频时长划分分桶后，40 秒处的 8 条弹幕是高光
+    peaks = aggregator.peaks(density, titles, pd.Series({"BV1": 600.0}))
+    assert peaks["moment"].tolist()[0] == "0:40"
+    assert peaks["count"].tolist()[0] == 8
+    assert peaks["video_title"].tolist()[0] == "标题"
+    assert len(peaks) <= aggregator.top_k
+
+
+def test_send_hours(aggregator):
+    # 0 点 UTC 即北京时间 8 点
+    df = aggregator.normalize_danmaku(danmaku("BV1", [1, 2, 3], send_ts=[0, 3600, 16 * 3600]))
+    hours = aggregator.send_hours(df).set_index("hour")["count"]
+    assert hours[8] == 1
+    assert hours[9] == 1
+    assert hours[0] == 1
+    assert hours.sum() == 3
+
+
+def test_parse_durations():
+    durations = DanmakuAggregator.parse_durations(pd.Series(["3:05", "1:02:03", "未知"]))
+    assert durations.tolist()[:2] == [185, 3723]
+    assert np.isnan(durations.tolist()[2])
+
+
+@pytest.fixture
+def local_tz(monkeypatch):
+    """把本地时区固定为指定值，测试结束后恢复"""
+    def set_tz(name):
+        monkeypatch.setenv("TZ", name)
+        time.tzset()
+
+    yield set_tz
+    monkeypatch.undo()
+    time.tzset()
+
+
+@pytest.mark.parametrize("tz_name", ["Asia/Shanghai", "America/New_York", "UTC"])
+def test_legacy_danmaku_columns(aggregator, local_tz, tz_name):
+    local_tz(tz_name)
+    send_ts = 1_700_000_000
+    raw = pd.DataFrame({
+        "bvid": ["BV1", "BV1"],
+        "video_title": ["标题", "标题"],
+        "danmaku_time": ["1:05", "未知"],
+        "danmaku_send_time": [datetime.fromtimestamp(send_ts).strftime('%Y-%m-%d %H:%M:%S')] * 2,
+    })
+    df = aggregator.normalize_danmaku(raw)
+    assert df["offset"].tolist() == [65]
+    assert df["send_ts"].tolist() == [send_ts]
+
+
+def test_legacy_danmaku_across_dst(aggregator, local_tz):
+    local_tz("America/New_York")
+    # 2023-11-05 凌晨 2 点夏令时结束：前一天按 UTC-4，后一天按 UTC-5
+    send_ts = [1699070400, 1699261200]  # 2023-11-04 00:00 EDT, 2023-11-06 04:00 EST
+    raw = pd.DataFrame({
+        "bvid": "BV1",
+        "video_title": "标题",
+        "danmaku_time": ["0:01", "0:02"],
+        "danmaku_send_time": [datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S') for ts in send_ts],
+    })
+    assert raw["danmaku_send_time"].tolist() == ["2023-11-04 00:00:00", "2023-11-06 04:00:00"]
+    assert aggregator.normalize_danmaku(raw)["send_ts"].tolist() == send_ts
+
+
+def test_peaks_ignores_uniform_density(aggregator):
+    titles = pd.Series({"BV1": "标题", "BV2": "标题"})
+    # BV1: 全部弹幕落在同一个分桶且没有时长；BV2: 每个分桶数量相同
+    df = aggregator.normalize_danmaku(pd.concat([
+        danmaku("BV1", [1, 2, 3, 4, 5]),
+        danmaku("BV2", [1, 2, 3, 11, 12, 13, 21, 22, 23]),
+    ]))
+    density = aggregator.density(df)
+    assert aggregator.peaks(density, titles).empty
+    assert aggregator.peaks(density, titles, pd.Series({"BV1": 5.0, "BV2": 30.0})).empty
+
+
+def test_run_overwrites_stale_tables(aggregator, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    stale = tmp_path / aggregator.PEAK_FILE
+    stale.write_text("old")
+
+    videos = pd.DataFrame({"BV号": ["BV1"], "视频标题": ["标题"], "UP主昵称": ["up"],
+                           "播放量": [1000], "评论数": [10], "视频时长": ["1:00"]})
+    details = pd.DataFrame({"bvid": ["BV1", "BV1"], "like": [50, 50], "coin": [20, 20], "favorite": [10, 10],
+                            "share": [5, 5], "danmaku_count": [5, 5]})
+    tables = aggregator.run(pd.DataFrame(), videos, details)
+
+    assert not stale.exists()
+    assert not os.path.exists(aggregator.DENSITY_FILE)
+    engagement = tables[aggregator.ENGAGEMENT_FILE]
+    assert engagement["engagement_rate"].tolist() == [0.1]
+    assert engagement["sampled_danmaku"].tolist() == [0]
+    assert os.path.exists(aggregator.ENGAGEMENT_FILE)
@@ -0,0 +1,141 @@
+import pandas as pd
+import pytest
+
+from tools.stat_tracker import BilibiliStatTracker
+
+
+def snapshot(bvid, ts, view, like=0, coin=0, favorite=0, share=0):
+    return {"bvid": bvid, "ts": ts, "view": view, "like": like, "coin": coin, "favorite": favorite, "share": share}
+
+
+@pytest.fixture
+def tracker(tmp_path):
+    return BilibiliStatTracker(snapshot_file=str(tmp_path / "snapshots.csv"))
+
+
+def test_round_trip(tracker):
+    history = [
+        [snapshot("BV1", 1000, 100, like=10), snapshot("BV2", 1000, 50)],
+        [snapshot("BV1", 4600, 160, like=12)],
+        [snapshot("BV1", 8200, 150, like=15), snapshot("BV2", 8200, 90, share=3)],
+    ]
+    for batch in history:
+        tracker.append_snapshots(batch)
+
+    deltas = tracker.load_deltas()
+    assert deltas["keyframe"].tolist() == [1, 1, 0, 0, 0]
+    # 第二行之后只存差值
+    assert deltas.iloc[2][["ts", "view", "like"]].tolist() == [3600, 60, 2]
+
+    snaps = tracker.load_snapshots()
+    expected = pd.DataFrame([s for batch in history for s in batch])
+    expected = expected.sort_values(["bvid", "ts"]).reset_index(drop=True)
+    actual = snaps.drop(columns="keyframe").sort_values(["bvid", "ts"]).reset_index(drop=True)
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+
+    latest = tracker.latest()
+    assert latest.loc["BV1", "view"] == 150
+    assert latest.loc["BV2", "share"] == 3
+
+
+def test_keyframe_interval(tracker):
+    tracker.KEYFRAME_INTERVAL = 3
+    for i in range(7):
+        tracker.append_snapshots([snapshot("BV1", 1000 + i * 3600, 100 + i * 10)])
+
+    assert tracker.load_deltas()["keyframe"].tolist() == [1, 0, 0, 1, 0, 0, 1]
+    assert tracker.load_snapshots()["view"].tolist() == [100 + i * 10 for i in range(7)]
+
+
+def test_empty_snapshot_file(tracker):
+    open(tracker.snapshot_file, "w").close()
+    assert tracker.load_snapshots().empty
+    assert tracker.growth_rates().empty
+
+    tracker.append_snapshots([snapshot("BV1", 1000, 100)])
+    assert tracker.latest().loc["BV1", "view"] == 100
+
+
+def test_growth_rates_window(tracker):
+    for i, view in enumerate([100, 200, 400, 700]):
+        tracker.append_snapshots([snapshot("BV1", i * 3600, view)])
+    tracker.append_snapshots([snapshot("BV2", 3 * 3600, 10)])
+    tracker.append_snapshots([snapshot("BV2", 4 * 3600, 30)])
+
+    growth = tracker.growth_rates(hours=2).set_index("bvid")
+
+    # BV1: 终点 3h，起点取不晚于 1h 的最后一次快照
+    assert growth.loc["BV1", "hours"] == 2
+    assert growth.loc["BV1", "view_delta"] == 500
+    assert growth.loc["BV1", "view_per_hour"] == 250
+    # BV2 追踪不足 2 小时，以第一次快照为起点
+    assert growth.loc["BV2", "hours"] == 1
+    assert growth.loc["BV2", "view_per_hour"] == 20
+    assert growth.index.tolist() == ["BV1", "BV2"]
+
+
+def test_growth_rates_single_snapshot(tracker):
+    tracker.append_snapshots([snapshot("BV1", 1000, 100)])
+    growth = tracker.growth_rates()
+    assert growth["view_per_hour"].isna().all()
+
+
+def test_growth_rates_unknown_field(tracker):
+    with pytest.raises(ValueError, match="views"):
+        tracker.growth_rates(field="views")
+
+
+def test_concurrent_appends(tracker):
+    import threading
+
+    def worker(offset):
+        other = BilibiliStatTracker(snapshot_file=tracker.snapshot_file)
+        for i in range(20):
+            other.append_snapshots([snapshot("BV1", offset + i, offset + i)])
+
+    threads = [threading.Thread(target=worker, args=(offset,)) for offset in (1000, 5000)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    snaps = tracker.load_snapshots()
+    assert len(snaps) == 40
+    assert (snaps["ts"] == snaps["view"]).all()
+
+
+
+def test_refresh_does_not_block_loop_on_lock(tracker, monkeypatch):
+    import asyncio
+    import threading
+
+    async def fake_fetch_stat(session, bvid):
+        return snapshot(bvid, 1000, 100)
+
+    monkeypatch.setattr(tracker, "fetch_stat", fake_fetch_stat)
+
+    acquired, release = threading.Event(), threading.Event()
+
+    def hold_lock():
+        with tracker._locked():
+            acquired.set()
+            release.wait(5)
+
+    holder = threading.Thread(target=hold_lock)
+    holder.start()
+    acquired.wait(5)
+
+    async def main():
+        refresh = asyncio.create_task(tracker.refresh_async(["BV1"]))
+        # 锁被其他进程/线程持有时，刷新在等待锁，但事件循环上的其他任务照常运行
+        await asyncio.sleep(1)
+        assert not refresh.done()
+        release.set()
+        return await refresh
+
+    try:
+        assert "1/1" in asyncio.run(main())
+    finally:
+        release.set()
+        holder.join()
+    assert tracker.latest().loc["BV1", "view"] == 100
@@ -0,0 +1,105 @@
+import asyncio
+import atexit
+import contextvars
+import threading
+import aiohttp
+from contextlib import asynccontextmanager
+from typing import Optional
+
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Referer': 'https://www.bilibili.com/'
+}
+
+# 后台常驻事件循环：同步调用方共用同一个循环，避免每次调用都新建/销毁循环
+_background_loop: Optional[asyncio.AbstractEventLoop] = None
+_background_thread: Optional[threading.Thread] = None
+_background_session: Optional[aiohttp.ClientSession] = None
+_background_lock = threading.Lock()
+
+# 当前调用链正在使用的 session，gather 出去的子任务会继承
+_current_session: contextvars.ContextVar = contextvars.ContextVar("bilibili_session", default=None)
+
+
+def get_background_loop() -> asyncio.AbstractEventLoop:
+    """获取（必要时启动）后台事件循环线程"""
+    global _background_loop, _background_thread
+    with _background_lock:
+        if _background_loop is None or _background_loop.is_closed():
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="bilibili-tool-loop", daemon=True)
+            thread.start()
+            _background_loop = loop
+            _background_thread = thread
+        return _background_loop
+
+
+def run_sync(coro):
+    """
+    在后台事件循环中执行协程并阻塞等待结果，调用方线程里有没有运行中的循环都可以用
+
+    不能在后台循环自身（即经由 run_sync 执行的协程内部）调用，否则会阻塞住要等待的循环，
+    这种情况请直接 await 对应的异步方法。
+    """
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is not None and running is _background_loop:
+        coro.close()
+        raise RuntimeError("run_sync 不能在后台事件循环内调用，请直接 await 对应的异步方法")
+    return asyncio.run_coroutine_threadsafe(coro, get_background_loop()).result()
+
+
+@asynccontextmanager
+async def session_scope():
+    """
+    提供本次调用使用的 aiohttp session
+
+    - 外层已经开启过 session 时直接复用
+    - 在后台循环上使用常驻 session，跨多次调用复用连接，进程退出时统一关闭
+    - 在调用方自己的循环上临时创建，用完即关（调用方的循环可能随时结束）
+    """
+    session = _current_session.get()
+    if session is not None and not session.closed:
+        yield session
+        return
+
+    if asyncio.get_running_loop() is _background_loop:
+        global _background_session
+        if _background_session is None or _background_session.closed:
+            _background_session = aiohttp.ClientSession(headers=HEADERS)
+        token = _current_session.set(_background_session)
+        try:
+            yield _background_session
+        finally:
+            _current_session.reset(token)
+    else:
+        async with aiohttp.ClientSession(headers=HEADERS) as session:
+            token = _current_session.set(session)
+            try:
+                yield session
+            finally:
+                _current_session.reset(token)
+
+
+async def _close_background_session():
+    if _background_session is not None and not _background_session.closed:
+        await _background_session.close()
+
+
+@atexit.register
+def _shutdown_background_loop():
+    """进程退出时关闭常驻 session 并停止后台循环"""
+    loop = _background_loop
+    if loop is None or loop.is_closed() or not loop.is_running():
+        return
+    try:
+        asyncio.run_coroutine_threadsafe(_close_background_session(), loop).result(timeout=5)
+    except Exception as e:
+        print(f"关闭后台 session 时出错: {e}")
+    loop.call_soon_threadsafe(loop.stop)
+    _background_thread.join(timeout=5)
+    if not loop.is_running():
+        loop.close()
@@ -0,0 +1,246 @@
+import os
+import numpy as np
+import pandas as pd
+from dateutil import tz
+from typing import Dict, Optional
+
+
+class DanmakuAggregator:
+    """
+    弹幕时间轴与互动指标聚合
+
+    弹幕的视频内偏移（秒）和发送时间戳都按数值数组处理，所有统计均为向量化计算，
+    结果写成几张小的汇总表，供 app.py 和分析 Agent 直接使用，而不必读取原始弹幕。
+    """
+
+    LIST_FILE = "b站列表数据.csv"
+    DETAIL_FILE = "b站详情数据.csv"
+    DANMAKU_FILE = "b站弹幕数据.csv"
+
+    DENSITY_FILE = "b站弹幕密度.csv"
+    PEAK_FILE = "b站弹幕高光时刻.csv"
+    HOUR_FILE = "b站弹幕发送时段.csv"
+    ENGAGEMENT_FILE = "b站互动指标.csv"
+
+    DANMAKU_COLUMNS = ["bvid", "video_title", "offset", "send_ts"]
+
+    # 发送时段按北京时间统计
+    TZ_OFFSET = 8 * 3600
+
+    def __init__(self, bin_seconds: int = 10, peak_z: float = 2.0, peak_min_count: int = 3, top_k: int = 3):
+        self.bin_seconds = bin_seconds
+        self.peak_z = peak_z
+        self.peak_min_count = peak_min_count
+        self.top_k = top_k
+
+    # ---------- 读取 ----------
+    def load_danmaku(self, danmaku_file: Optional[str] = None) -> pd.DataFrame:
+        """从弹幕表读取，只加载聚合需要的列"""
+        danmaku_file = danmaku_file or self.DANMAKU_FILE
+        if not os.path.exists(danmaku_file):
+            return pd.DataFrame(columns=self.DANMAKU_COLUMNS)
+
+        header = pd.read_csv(danmaku_file, encoding='utf-8-sig', nrows=0).columns
+        if "danmaku_offset" in header and "danmaku_send_ts" in header:
+            usecols = ["bvid", "video_title", "danmaku_offset", "danmaku_send_ts"]
+        else:
+            usecols = ["bvid", "video_title", "danmaku_time", "danmaku_send_time"]
+        return self.normalize_danmaku(pd.read_csv(danmaku_file, encoding='utf-8-sig', usecols=usecols))
+
+    def normalize_danmaku(self, raw: pd.DataFrame) -> pd.DataFrame:
+        """
+        把弹幕表（内存中的或从 CSV 读取的）整理为数值列：bvid、video_title、offset（秒）、send_ts（Unix 时间戳）
+
+        旧版弹幕表没有数值列时，从 "m:ss" 和格式化的发送时间整体反解析。
+        """
+        if raw.empty:
+            return pd.DataFrame(columns=self.DANMAKU_COLUMNS)
+
+        if "danmaku_offset" in raw.columns and "danmaku_send_ts" in raw.columns:
+            return pd.DataFrame({
+                "bvid": raw["bvid"].astype(str),
+                "video_title": raw["video_title"],
+                "offset": raw["danmaku_offset"].astype(np.float64),
+                "send_ts": raw["danmaku_send_ts"].astype(np.int64),
+            })
+
+        minutes = pd.to_numeric(raw["danmaku_time"].astype(str).str.extract(r"^(\d+):", expand=False), errors="coerce")
+        seconds = pd.to_numeric(raw["danmaku_time"].astype(str).str.extract(r":(\d+)$", expand=False), errors="coerce")
+        # 旧表的发送时间是用 datetime.fromtimestamp 按抓取机器的本地时区格式化的，
+        # 逐行按本地时区（含夏令时）还原；夏令时切换时重复或不存在的时刻无法确定，记为无效
+        send_time = pd.to_datetime(raw["danmaku_send_time"], errors="coerce").dt.tz_localize(
+            tz.tzlocal(), ambiguous="NaT", nonexistent="NaT")
+        valid = minutes.notna() & seconds.notna() & send_time.notna()
+        return pd.DataFrame({
+            "bvid": raw["bvid"][valid].astype(str),
+            "video_title": raw["video_title"][valid],
+            "offset": (minutes * 60 + seconds)[valid],
+            "send_ts": (send_time[valid] - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(seconds=1),
+        }).reset_index(drop=True)
+
+    @staticmethod
+    def parse_durations(durations: pd.Series) -> pd.Series:
+        """把列表表中的 "m:ss" / "h:mm:ss" 视频时长整体转换为秒，无法解析的为 NaN"""
+        parts = durations.astype(str).str.extract(r"^(?:(\d+):)?(\d+):(\d+)$").apply(pd.to_numeric)
+        return parts[0].fillna(0) * 3600 + parts[1] * 60 + parts[2]
+
+    # ---------- 聚合 ----------
+    def density(self, df: pd.DataFrame) -> pd.DataFrame:
+        """每个视频按 bin_seconds 分桶的弹幕数量直方图"""
+        if df.empty:
+            return pd.DataFrame(columns=["bvid", "bin_start", "count"])
+        bins = (df["offset"].to_numpy(dtype=np.float64) // self.bin_seconds).astype(np.int64)
+        counts = df.assign(bin_start=bins * self.bin_seconds).groupby(["bvid", "bin_start"]).size()
+        return counts.rename("count").reset_index()
+
+    def peaks(self, density: pd.DataFrame, titles: pd.Series,
+              durations: Optional[pd.Series] = None) -> pd.DataFrame:
+        """
+        检测每个视频的弹幕高光时刻
+
+        按视频时长（durations，bvid -> 秒）划分全部分桶，空桶按 0 计入均值和标准差；没有时长的视频
+        退化为以最后一个有弹幕的分桶为止。分桶数量严格高于均值、超过均值 peak_z 个标准差，
+        且不少于 peak_min_count 条的记为高光，每个视频最多保留 top_k 个。
+        """
+        columns = ["bvid", "video_title", "moment", "bin_start", "count", "ratio_to_mean"]
+        if density.empty:
+            return pd.DataFrame(columns=columns)
+
+        counts = density["count"].to_numpy(dtype=np.float64)
+        grouped = density.assign(sq=counts ** 2).groupby("bvid")
+        n_bins = grouped["bin_start"].max() // self.bin_seconds + 1
+        if durations is not None:
+            duration_bins = np.ceil(durations.reindex(n_bins.index) / self.bin_seconds)
+            n_bins = np.maximum(n_bins, duration_bins.fillna(0))
+        mean = grouped["count"].sum() / n_bins
+        std = np.sqrt((grouped["sq"].sum() / n_bins - mean ** 2).clip(lower=0))
+
+        video_mean = density["bvid"].map(mean)
+        threshold = np.maximum(video_mean + self.peak_z * density["bvid"].map(std), self.peak_min_count)
+        # 同时要求严格高于均值：各分桶数量相同时标准差为 0，否则每个分桶都会被当成高光
+        is_peak = (density["count"] >= threshold) & (density["count"] > video_mean)
+        peaks = density[is_peak].assign(ratio_to_mean=(density["count"] / video_mean).round(2))
+        peaks = peaks.sort_values(["bvid", "count"], ascending=[True, False]).groupby("bvid").head(self.top_k)
+
+        start = peaks["bin_start"].to_numpy()
+        peaks["moment"] = (
+            pd.Series(start // 60, index=peaks.index).astype(str) + ":"
+            + pd.Series(start % 60, index=peaks.index).astype(str).str.zfill(2)
+        )
+        peaks["video_title"] = peaks["bvid"].map(titles)
+        return peaks[columns].reset_index(drop=True)
+
+    def send_hours(self, df: pd.DataFrame) -> pd.DataFrame:
+        """全部弹幕按发送小时（北京时间）的分布"""
+        hours = ((df["send_ts"].to_numpy(dtype=np.int64) + self.TZ_OFFSET) // 3600) % 24
+        counts = np.bincount(hours, minlength=24)
+        total = counts.sum()
+        return pd.DataFrame({
+            "hour": np.arange(24),
+            "count": counts,
+            "share": np.round(counts / total, 4) if total else np.zeros(24),
+        })
+
+    def engagement(self, df: pd.DataFrame, videos: pd.DataFrame, details: pd.DataFrame) -> pd.DataFrame:
+        """结合列表表与详情表，计算每个视频的互动率指标"""
+        if videos.empty or details.empty:
+            return pd.DataFrame()
+
+        videos = videos[["BV号", "视频标题", "UP主昵称", "播放量", "评论数"]].rename(
+            columns={"BV号": "bvid", "视频标题": "video_title", "UP主昵称": "author",
+                     "播放量": "play", "评论数": "review"})
+        # 详情表每条评论一行，视频级的统计字段是重复的
+        stats = details[["bvid", "like", "coin", "favorite", "share", "danmaku_count"]].drop_duplicates("bvid")
+
+        result = videos.drop_duplicates("bvid").merge(stats, on="bvid", how="left")
+        metrics = ["play", "review", "like", "coin", "favorite", "share", "danmaku_count"]
+        result[metrics] = result[metrics].apply(pd.to_numeric, errors="coerce").fillna(0).astype(np.int64)
+
+        play = result["play"].where(result["play"] > 0)
+        for field in ["like", "coin", "favorite", "share", "review", "danmaku_count"]:
+            result[f"{field}_rate"] = (result[field] / play).round(4)
+        interactions = result[["like", "coin", "favorite", "share", "review", "danmaku_count"]].sum(axis=1)
+        result["engagement_rate"] = (interactions / play).round(4)
+        result["sampled_danmaku"] = result["bvid"].map(df["bvid"].value_counts()).fillna(0).astype(np.int64)
+
+        return result.sort_values("engagement_rate", ascending=False).reset_index(drop=True)
+
+    # ---------- 入口 ----------
+    def run(self, danmaku: Optional[pd.DataFrame] = None, videos: Optional[pd.DataFrame] = None,
+            details: Optional[pd.DataFrame] = None) -> Dict[str, pd.DataFrame]:
+        """
+        计算全部汇总表并保存到固定文件名
+
+        抓取流程直接传入本次的内存数据；未传入的表从固定文件名读取（命令行单独运行时）。
+        每张汇总表都会覆盖写入，为空时删除旧文件，避免残留上一次关键词的结果。
+        """
+        if danmaku is None:
+            danmaku = self.load_danmaku()
+        else:
+            danmaku = self.normalize_danmaku(danmaku)
+        if videos is None:
+            videos = self._read_table(self.LIST_FILE)
+        if details is None:
+            details = self._read_table(self.DETAIL_FILE)
+
+        titles = danmaku.drop_duplicates("bvid").set_index("bvid")["video_title"]
+        durations = None
+        if not videos.empty:
+            unique_videos = videos.drop_duplicates("BV号")
+            durations = pd.Series(self.parse_durations(unique_videos["视频时长"]).to_numpy(),
+                                  index=unique_videos["BV号"].astype(str))
+
+        density = self.density(danmaku)
+        tables = {
+            self.DENSITY_FILE: density,
+            self.PEAK_FILE: self.peaks(density, titles, durations),
+            self.HOUR_FILE: self.send_hours(danmaku) if not danmaku.empty else pd.DataFrame(),
+            self.ENGAGEMENT_FILE: self.engagement(danmaku, videos, details),
+        }
+        for path, table in tables.items():
+            if not table.empty:
+                table.to_csv(path, index=False, encoding='utf-8-sig')
+                print(f"汇总数据已保存到 '{path}'")
+            elif os.path.exists(path):
+                os.remove(path)
+                print(f"本次没有 '{path}' 的数据，已删除旧文件")
+        return tables
+
+    @staticmethod
+    def _read_table(path: str) -> pd.DataFrame:
+        if not os.path.exists(path):
+            return pd.DataFrame()
+        return pd.read_csv(path, encoding='utf-8-sig')
+
+    def summary_text(self, tables: Dict[str, pd.DataFrame], top_n: int = 5) -> str:
+        """把汇总表压缩成一段文本，供分析 Agent 直接阅读"""
+        sections = []
+        engagement = tables.get(self.ENGAGEMENT_FILE)
+        if engagement is not None and not engagement.empty:
+            cols = ["video_title", "author", "play", "engagement_rate", "like_rate", "coin_rate", "favorite_rate"]
+            sections.append(f"互动率最高的 {top_n} 个视频：\n" + engagement[cols].head(top_n).to_string(index=False))
+
+        density = tables.get(self.DENSITY_FILE)
+        if density is not None and not density.empty:
+            per_video = density.groupby("bvid")["count"].sum()
+            sections.append(f"说明：弹幕统计基于采样，共 {len(per_video)} 个视频、{int(per_video.sum())} 条弹幕，"
+                            f"每个视频最多 {int(per_video.max())} 条（取弹幕接口返回的前若干条，并非全量），"
+                            f"以下高光时刻和时段分布仅供参考。")
+
+        peaks = tables.get(self.PEAK_FILE)
+        if peaks is not None and not peaks.empty:
+            top = peaks.sort_values("count", ascending=False).head(top_n)
+            sections.append("弹幕高光时刻：\n" + top[["video_title", "moment", "count", "ratio_to_mean"]].to_string(index=False))
+
+        hours = tables.get(self.HOUR_FILE)
+        if hours is not None and not hours.empty and hours["count"].sum() > 0:
+            top_hours = hours.sort_values("count", ascending=False).head(3)
+            sections.append("弹幕发送最集中的时段：" + "、".join(f"{h}点" for h in top_hours["hour"]))
+
+        return "\n\n".join(sections)
+
+
+# 使用示例
+if __name__ == '__main__':
+    aggregator = DanmakuAggregator()
+    print(aggregator.summary_text(aggregator.run()))
@@ -6,23 +6,19 @@ from datetime import datetime
 import time
 import re
 import html
-import aiohttp
 import json
 import xml.etree.ElementTree as ET
 from crewai.tools import BaseTool
-from typing import Optional,ClassVar
+from typing import Optional
+
+from tools.async_runtime import run_sync, session_scope
+from tools.danmaku_stats import DanmakuAggregator
 
 
 class BilibiliSearchTool(BaseTool):
     name: str = "B站视频数据抓取工具"
     description: str = "抓取B站搜索结果的视频数据，包括列表信息、详情和弹幕内容"
 
-    # 1. 声明为类变量（Pydantic 不会拦截）
-    HEADERS: ClassVar[dict] = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Referer': 'https://www.bilibili.com/'
-    }
-
     def __init__(self):
         super().__init__()
         # self.HEADERS = {
@@ -44,9 +40,18 @@ class BilibiliSearchTool(BaseTool):
         Returns:
             str: 执行结果信息
         """
-        # 运行异步主函数
-        result = asyncio.run(self.main_async(keyword, max_videos, comment_pages, max_danmaku))
-        return result
+        # 交给后台常驻事件循环执行，调用方已有运行中的循环（Streamlit 等）时也能用
+        return run_sync(self._arun(keyword, max_videos, comment_pages, max_danmaku))
+
+    async def _arun(self, keyword: str, max_videos: Optional[int] = 10,
+                    comment_pages: Optional[int] = 2, max_danmaku: Optional[int] = 50) -> str:
+        """
+        _run 的异步版本，直接在调用方的事件循环中执行
+
+        在后台循环上复用常驻 session；在调用方自己的循环上，本次调用的 session 会在返回前关闭。
+        """
+        async with session_scope():
+            return await self.main_async(keyword, max_videos, comment_pages, max_danmaku)
 
     async def main_async(self, keyword: str, max_videos: int,
                          comment_pages: int, max_danmaku: int) -> str:
@@ -148,7 +153,10 @@ class BilibiliSearchTool(BaseTool):
                                 # "danmaku_type": dm['type'],
                                 # "danmaku_size": dm['size'],
                                 # "danmaku_color": dm['color'],
-                                "danmaku_send_time": dm['send_time']
+                                "danmaku_send_time": dm['send_time'],
+                                # 保留数值形式，供 danmaku_stats 向量化聚合
+                                "danmaku_offset": dm['offset'],
+                                "danmaku_send_ts": dm['timestamp']
                             }
                             all_danmaku_data.append(dm_record)
                         print(f"视频 '{clean_title_text}' 获取了 {len(danmaku)} 条弹幕")
@@ -182,9 +190,20 @@ class BilibiliSearchTool(BaseTool):
         print(f"总共获取了 {total_videos} 个视频")
 
         # 保存数据到固定文件名
-        self.save_data_to_fixed_files(all_video_list_data, all_video_detail_data, all_danmaku_data, keyword)
+        # CSV 读写是阻塞操作，放到线程里执行，不占用调用方的事件循环
+        await asyncio.to_thread(self.save_data_to_fixed_files,
+                                all_video_list_data, all_video_detail_data, all_danmaku_data, keyword)
+
+        # 用本次抓取的内存数据生成弹幕时间轴与互动指标汇总表，不读回磁盘上可能残留的旧文件
+        aggregator = DanmakuAggregator()
+        tables = await asyncio.to_thread(aggregator.run,
+                                         pd.DataFrame(all_danmaku_data),
+                                         pd.DataFrame(all_video_list_data),
+                                         pd.DataFrame(all_video_detail_data))
+        summary = aggregator.summary_text(tables)
 
-        return f"成功抓取 {total_videos} 个视频数据。列表数据保存到 'b站列表数据.csv'，详情数据保存到 'b站详情数据.csv'，弹幕数据保存到 'b站弹幕数据.csv'"
+        return (f"成功抓取 {total_videos} 个视频数据。列表数据保存到 'b站列表数据.csv'，详情数据保存到 'b站详情数据.csv'，弹幕数据保存到 'b站弹幕数据.csv'。"
+                f"汇总表保存到 '{aggregator.ENGAGEMENT_FILE}'、'{aggregator.PEAK_FILE}'、'{aggregator.HOUR_FILE}'、'{aggregator.DENSITY_FILE}'。\n\n{summary}")
 
     def save_data_to_fixed_files(self, list_data, detail_data, danmaku_data, keyword):
         """保存数据到固定文件名"""
@@ -267,11 +286,11 @@ class BilibiliSearchTool(BaseTool):
         comments = []
         page = 1
 
-        async with aiohttp.ClientSession() as session:
+        async with session_scope() as session:
             while page <= max_pages:
                 try:
                     comment_url = f"https://api.bilibili.com/x/v2/reply?type=1&oid={aid}&sort=2&pn={page}&ps=20"
-                    async with session.get(comment_url, headers=self.HEADERS) as response:
+                    async with session.get(comment_url) as response:
                         if response.status == 200:
                             comment_data = await response.json()
                             if comment_data['code'] == 0 and 'replies' in comment_data['data']:
@@ -307,9 +326,9 @@ class BilibiliSearchTool(BaseTool):
         danmaku_list = []
 
         try:
-            async with aiohttp.ClientSession() as session:
+            async with session_scope() as session:
                 danmaku_url = f"https://api.bilibili.com/x/v1/dm/list.so?oid={cid}"
-                async with session.get(danmaku_url, headers=self.HEADERS) as response:
+                async with session.get(danmaku_url) as response:
                     if response.status == 200:
                         xml_content = await response.text()
                         root = ET.fromstring(xml_content)
@@ -334,7 +353,9 @@ class BilibiliSearchTool(BaseTool):
                                 "type": danmaku_type,
                                 "size": danmaku_size,
                                 "color": f"#{danmaku_color:06x}",
-                                "send_time": danmaku_send_time
+                                "send_time": danmaku_send_time,
+                                "offset": danmaku_time,
+                                "timestamp": danmaku_timestamp
                             })
 
                         print(f"获取了 {len(danmaku_list)} 条弹幕")
@@ -348,9 +369,9 @@ class BilibiliSearchTool(BaseTool):
     async def fetch_video_detail_direct(self, bvid: str, comment_pages: int, max_danmaku: int):
         """直接通过API获取视频详细信息的异步函数"""
         try:
-            async with aiohttp.ClientSession() as session:
+            async with session_scope() as session:
                 info_url = f"https://api.bilibili.com/x/web-interface/view?bvid={bvid}"
-                async with session.get(info_url, headers=self.HEADERS) as response:
+                async with session.get(info_url) as response:
                     if response.status == 200:
                         info_data = await response.json()
                         if info_data['code'] == 0:
@@ -0,0 +1,283 @@
+import asyncio
+import os
+import time
+import aiohttp
+import pandas as pd
+from contextlib import contextmanager
+from typing import Iterable, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from tools.async_runtime import run_sync, session_scope
+
+
+class BilibiliStatTracker:
+    """
+    B站视频统计数据追踪
+
+    按 bvid 保存播放、点赞、投币、收藏、转发的时间序列快照。
+    快照表为增量编码：keyframe=1 的行存绝对值，其余行只存与上一次快照的差值（时间戳同理），
+    新快照直接追加到 CSV 末尾，不需要重写整张表。每个 bvid 每 KEYFRAME_INTERVAL 行写一次关键帧，
+    个别坏行最多影响到下一个关键帧为止。
+    """
+
+    SNAPSHOT_FILE = "b站统计快照.csv"
+    LIST_FILE = "b站列表数据.csv"
+    STAT_FIELDS = ["view", "like", "coin", "favorite", "share"]
+    VALUE_COLUMNS = ["ts"] + STAT_FIELDS
+    COLUMNS = ["bvid", "keyframe"] + VALUE_COLUMNS
+    KEYFRAME_INTERVAL = 24
+
+    # 只请求轻量的统计接口，不抓评论和弹幕
+    STAT_URL = "https://api.bilibili.com/x/web-interface/archive/stat?bvid={bvid}"
+
+    def __init__(self, snapshot_file: Optional[str] = None, concurrency: int = 4):
+        self.snapshot_file = snapshot_file or self.SNAPSHOT_FILE
+        self.concurrency = concurrency
+
+    # ---------- 快照表读写 ----------
+    @contextmanager
+    def _locked(self):
+        """快照表的进程间互斥锁：读取最新值和追加增量必须作为一个整体完成"""
+        with open(self.snapshot_file + ".lock", "a+") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def load_deltas(self) -> pd.DataFrame:
+        """读取原始的增量编码快照表"""
+        if not os.path.exists(self.snapshot_file):
+            return pd.DataFrame(columns=self.COLUMNS)
+        try:
+            df = pd.read_csv(self.snapshot_file, encoding='utf-8-sig', dtype={"bvid": str})
+        except pd.errors.EmptyDataError:
+            # 首次写入被中断时会留下空文件
+            return pd.DataFrame(columns=self.COLUMNS)
+        return df[self.COLUMNS]
+
+    def decode(self, deltas: pd.DataFrame) -> pd.DataFrame:
+        """按 bvid 从最近的关键帧开始累加，把增量还原为绝对值"""
+        df = deltas.copy()
+        if df.empty:
+            return df
+        segment = df.groupby("bvid", sort=False)["keyframe"].cumsum()
+        df[self.VALUE_COLUMNS] = df.groupby([df["bvid"], segment], sort=False)[self.VALUE_COLUMNS].cumsum()
+
+        broken = df.loc[(df[self.VALUE_COLUMNS] < 0).any(axis=1), "bvid"].unique()
+        if len(broken):
+            print(f"警告: 以下视频的快照还原后出现负值，数据可能已损坏: {', '.join(broken)}")
+        return df
+
+    def load_snapshots(self) -> pd.DataFrame:
+        """读取快照表并还原为绝对值"""
+        return self.decode(self.load_deltas())
+
+    def latest(self) -> pd.DataFrame:
+        """每个 bvid 的最新快照"""
+        df = self.load_snapshots()
+        if df.empty:
+            return pd.DataFrame(columns=self.VALUE_COLUMNS)
+        return df.groupby("bvid", sort=False).tail(1).set_index("bvid")[self.VALUE_COLUMNS]
+
+    def tracked_bvids(self) -> List[str]:
+        """当前已追踪的视频"""
+        return self.latest().index.tolist()
+
+    def encode(self, deltas: pd.DataFrame, snapshots: List[dict]) -> pd.DataFrame:
+        """把新的绝对值快照编码为相对于已有快照表的增量行"""
+        new = pd.DataFrame(snapshots, columns=self.COLUMNS).drop_duplicates("bvid", keep="last")
+        values = new[self.VALUE_COLUMNS].to_numpy(dtype="int64")
+
+        snaps = self.decode(deltas)
+        if snaps.empty:
+            new["keyframe"] = 1
+            new[self.VALUE_COLUMNS] = values
+            return new.reset_index(drop=True)
+
+        latest = snaps.groupby("bvid", sort=False).tail(1).set_index("bvid")[self.VALUE_COLUMNS]
+        # 距离最近一个关键帧已经写了多少行
+        segment = snaps.groupby("bvid", sort=False)["keyframe"].cumsum()
+        since_keyframe = snaps.groupby([snaps["bvid"], segment], sort=False).size().groupby(level=0).last()
+
+        tracked = new["bvid"].isin(latest.index).to_numpy()
+        due = new["bvid"].map(since_keyframe).fillna(0).to_numpy() >= self.KEYFRAME_INTERVAL
+        keyframe = ~tracked | due
+
+        prev = latest.reindex(new["bvid"]).fillna(0).to_numpy(dtype="int64")
+        new["keyframe"] = keyframe.astype("int64")
+        new[self.VALUE_COLUMNS] = values - prev * ~keyframe[:, None]
+        return new.reset_index(drop=True)
+
+    def append_snapshots(self, snapshots: List[dict]):
+        """把新的绝对值快照编码为增量后追加到快照表"""
+        if not snapshots:
+            return
+        with self._locked():
+            new = self.encode(self.load_deltas(), snapshots)
+            write_header = not os.path.exists(self.snapshot_file) or os.path.getsize(self.snapshot_file) == 0
+            new.to_csv(self.snapshot_file, mode='a', header=write_header, index=False, encoding='utf-8-sig')
+        print(f"已追加 {len(new)} 条快照到 '{self.snapshot_file}'")
+
+    # ---------- 抓取 ----------
+    async def fetch_stat(self, session: aiohttp.ClientSession, bvid: str) -> Optional[dict]:
+        """只获取单个视频的统计数据"""
+        try:
+            async with session.get(self.STAT_URL.format(bvid=bvid)) as response:
+                if response.status != 200:
+                    print(f"获取视频 {bvid} 统计失败: HTTP {response.status}")
+                    return None
+                stat_data = await response.json()
+                if stat_data['code'] != 0:
+                    print(f"获取视频 {bvid} 统计失败: {stat_data.get('message', '未知错误')}")
+                    return None
+                stat = stat_data['data']
+                snapshot = {"bvid": bvid, "ts": int(time.time())}
+                for field in self.STAT_FIELDS:
+                    snapshot[field] = int(stat.get(field, 0) or 0)
+                return snapshot
+        except Exception as e:
+            print(f"获取视频 {bvid} 统计时出错: {e}")
+            return None
+
+    async def refresh_async(self, bvids: Optional[Iterable[str]] = None, max_age: int = 3600) -> str:
+        """
+        刷新过期的快照
+
+        Args:
+            bvids: 要刷新的视频，默认为全部已追踪视频；未追踪过的视频会被加入追踪
+            max_age: 快照过期时间（秒），最新快照比这更新的视频会被跳过
+
+        Returns:
+            str: 执行结果信息
+        """
+        # 快照表读写（含跨进程锁等待）都是阻塞操作，放到线程里执行，不占用事件循环
+        latest = await asyncio.to_thread(self.latest)
+        candidates = list(dict.fromkeys(bvids)) if bvids is not None else latest.index.tolist()
+        now = int(time.time())
+        last_ts = latest["ts"].reindex(candidates)
+        stale = [bvid for bvid, ts in zip(candidates, last_ts) if pd.isna(ts) or now - ts >= max_age]
+
+        if not stale:
+            return f"{len(candidates)} 个视频的快照都未过期，无需刷新"
+
+        print(f"共 {len(candidates)} 个视频，其中 {len(stale)} 个需要刷新")
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async with session_scope() as session:
+            async def fetch_one(bvid):
+                async with semaphore:
+                    snapshot = await self.fetch_stat(session, bvid)
+                    # 添加延迟，避免请求过于频繁
+                    await asyncio.sleep(0.5)
+                    return snapshot
+
+            results = await asyncio.gather(*(fetch_one(bvid) for bvid in stale))
+
+        snapshots = [s for s in results if s]
+        await asyncio.to_thread(self.append_snapshots, snapshots)
+        return f"成功刷新 {len(snapshots)}/{len(stale)} 个视频的统计数据，快照保存到 '{self.snapshot_file}'"
+
+    def refresh(self, bvids: Optional[Iterable[str]] = None, max_age: int = 3600) -> str:
+        """同步版本的 refresh_async，在后台常驻事件循环中执行"""
+        return run_sync(self.refresh_async(bvids, max_age))
+
+    def track_from_list(self, list_file: Optional[str] = None) -> str:
+        """把列表数据中的视频加入追踪并立即记录一次快照"""
+        list_file = list_file or self.LIST_FILE
+        if not os.path.exists(list_file):
+            return f"未找到 '{list_file}'，请先抓取列表数据"
+        bvids = pd.read_csv(list_file, encoding='utf-8-sig')["BV号"].dropna().astype(str).tolist()
+        return self.refresh(bvids)
+
+    # ---------- 查询 ----------
+    def growth_rates(self, hours: float = 24, field: str = "view") -> pd.DataFrame:
+        """
+        计算每个视频在最近一段时间内的增长
+
+        以最新快照为终点，取不晚于 (最新时间 - hours) 的最后一次快照为起点；
+        若追踪时间不足 hours，则以第一次快照为起点。
+
+        Args:
+            hours: 时间窗口（小时）
+            field: 按哪个指标排序
+
+        Returns:
+            DataFrame: 每个 bvid 的各指标增量及每小时增长，按 field 的每小时增长降序
+
+        Raises:
+            ValueError: field 不是 STAT_FIELDS 中的指标
+        """
+        if field not in self.STAT_FIELDS:
+            raise ValueError(f"未知指标 '{field}'，可选: {', '.join(self.STAT_FIELDS)}")
+
+        df = self.load_snapshots()
+        if df.empty:
+            return pd.DataFrame()
+
+        grouped = df.groupby("bvid", sort=False)
+        last = grouped.tail(1).set_index("bvid")
+        first = grouped.head(1).set_index("bvid")
+
+        cutoff = df["bvid"].map(last["ts"] - int(hours * 3600))
+        base = df[df["ts"] <= cutoff].groupby("bvid", sort=False).tail(1).set_index("bvid")
+        base = base.combine_first(first).reindex(last.index)
+
+        elapsed = (last["ts"] - base["ts"]) / 3600
+        elapsed = elapsed.where(elapsed > 0)
+
+        result = pd.DataFrame({
+            "start_time": pd.to_datetime(base["ts"], unit="s"),
+            "end_time": pd.to_datetime(last["ts"], unit="s"),
+            "hours": elapsed,
+        })
+        for f in self.STAT_FIELDS:
+            result[f] = last[f]
+            result[f"{f}_delta"] = last[f] - base[f]
+            result[f"{f}_per_hour"] = result[f"{f}_delta"] / elapsed
+
+        return result.sort_values(f"{field}_per_hour", ascending=False).reset_index()
+
+
+# 使用示例
+if __name__ == '__main__':
+    import sys
+    if len(sys.argv) < 2 or sys.argv[1] not in ("track", "refresh", "growth"):
+        print("用法: python -m tools.stat_tracker track [BV号 ...]")
+        print("      python -m tools.stat_tracker refresh [过期分钟数]")
+        print("      python -m tools.stat_tracker growth [小时数] [指标]")
+        sys.exit(1)
+
+    tracker = BilibiliStatTracker()
+    command = sys.argv[1]
+
+    if command == "track":
+        if len(sys.argv) > 2:
+            print(tracker.refresh(sys.argv[2:]))
+        else:
+            print(tracker.track_from_list())
+    elif command == "refresh":
+        max_age = int(float(sys.argv[2]) * 60) if len(sys.argv) > 2 else 3600
+        print(tracker.refresh(max_age=max_age))
+    else:
+        hours = float(sys.argv[2]) if len(sys.argv) > 2 else 24
+        field = sys.argv[3] if len(sys.argv) > 3 else "view"
+        try:
+            growth = tracker.growth_rates(hours, field)
+        except ValueError as e:
+            print(e)
+            sys.exit(1)
+        print(growth.to_string(index=False) if not growth.empty else "暂无快照数据")